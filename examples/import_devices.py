@@ -0,0 +1,55 @@
+import asyncio
+import json
+import sys
+import os
+
+from aiohttp import ClientSession, ClientTimeout
+from dotenv import load_dotenv
+
+from milesight_gateway_api.milesight_gateway_client import MilesightGatewayClient
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Example usage
+async def main(file_path='export/devices_export.csv', dry_run=True):
+
+    # Configuration
+    username = os.getenv('USERNAME')
+    password = os.getenv('PASSWORD')
+    secret_key = bytes(os.getenv('SECRET_KEY'), 'utf-8')  
+    iv = bytes(os.getenv('IV'), 'utf-8')  
+    base_url = os.getenv('BASE_URL')
+    port = os.getenv('PORT')
+
+    client = MilesightGatewayClient(username, password, secret_key, iv, base_url, port)
+
+    async with ClientSession(timeout=ClientTimeout(total=30)) as session:
+        try:
+            # Step 1: Get JWT token
+            await client.get_jwt_token(session)
+
+            # Step 2: Read the devices from a CSV in the layout of export_devices.py
+            devices = client.read_devices_csv(file_path)
+            print(f"Read {len(devices)} devices from {file_path}")
+
+            # Step 3: Create the missing devices (only shows the plan while dry_run is True)
+            results = await client.bulk_create_devices(session, devices, concurrency=5, rate_limit=10, dry_run=dry_run)
+            print(json.dumps(results, indent=4))
+
+        except Exception as e:
+            print(f"Error: {e}")
+
+
+if __name__ == "__main__":
+    if sys.version_info[0] == 3 and sys.version_info[1] >= 8 and sys.platform.startswith('win'):
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    loop = asyncio.new_event_loop()    
+    asyncio.set_event_loop(loop)    
+
+    try:
+        loop.run_until_complete(main())
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
@@ -0,0 +1,91 @@
+import logging
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # pragma: no cover - pyarrow is an optional dependency
+    pa = None
+    pc = None
+
+# Device fields with few distinct values, stored dictionary-encoded
+DICTIONARY_COLUMNS = ('appName', 'profileName', 'payloadName')
+
+# Device fields with mostly unique values, stored as plain strings
+STRING_COLUMNS = ('devEUI', 'name')
+
+
+def require_pyarrow():
+    """Raises an ImportError with install instructions if pyarrow is missing."""
+    if pa is None:
+        raise ImportError("The device table needs pyarrow: pip install Milesight-Gateway-API[columnar]")
+
+
+def device_table_schema(gateway=None):
+    """Returns the Arrow schema of a device table."""
+    require_pyarrow()
+    dictionary_type = pa.dictionary(pa.int32(), pa.string())
+    fields = [pa.field(column, pa.string()) for column in STRING_COLUMNS]
+    fields += [pa.field(column, dictionary_type) for column in DICTIONARY_COLUMNS]
+    fields.append(pa.field('fPort', pa.int32()))
+    if gateway is not None:
+        fields.append(pa.field('gateway', dictionary_type))
+    return pa.schema(fields)
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def device_page_to_batch(devices, schema, gateway=None):
+    """Converts one page of devices from /api/urdevices into an Arrow record batch."""
+    arrays = [pa.array([device.get(column) for device in devices], type=schema.field(column).type)
+              for column in STRING_COLUMNS + DICTIONARY_COLUMNS]
+    arrays.append(pa.array([_to_int(device.get('fPort')) for device in devices], type=pa.int32()))
+    if gateway is not None:
+        arrays.append(pa.array([gateway] * len(devices), type=schema.field('gateway').type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+async def device_table_from_pages(pages, gateway=None):
+    """
+    Builds a device table from an async iterable of device pages.
+
+    Every page becomes one record batch, so the device dicts of only one page are held in memory.
+    The dictionaries of the encoded columns are unified across pages. If gateway is given, it is
+    added as a dictionary-encoded 'gateway' column so tables of several gateways can be combined.
+    """
+    schema = device_table_schema(gateway)
+    batches = []
+    async for devices in pages:
+        batches.append(device_page_to_batch(devices, schema, gateway))
+    table = pa.Table.from_batches(batches, schema=schema).unify_dictionaries()
+    logging.debug(f"Built device table with {table.num_rows} devices from {len(batches)} pages.")
+    return table
+
+
+def concat_device_tables(tables):
+    """Combines the device tables of several gateways into one table."""
+    require_pyarrow()
+    return pa.concat_tables(tables).unify_dictionaries()
+
+
+def filter_devices(table, **equals):
+    """Returns the rows of a device table where every given column equals the given value."""
+    require_pyarrow()
+    mask = None
+    for column, value in equals.items():
+        condition = pc.equal(table[column], value)
+        mask = condition if mask is None else pc.and_(mask, condition)
+    return table if mask is None else table.filter(mask)
+
+
+def count_devices_by(table, *columns):
+    """Returns the number of devices per value of the given columns, largest groups first."""
+    require_pyarrow()
+    counts = table.group_by(list(columns)).aggregate([('devEUI', 'count')])
+    # The position of the aggregate column depends on the pyarrow version, so select by name
+    counts = pa.table([counts[column] for column in columns] + [counts['devEUI_count']], names=list(columns) + ['count'])
+    return counts.sort_by([('count', 'descending')])
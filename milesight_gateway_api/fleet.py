@@ -0,0 +1,131 @@
+import asyncio
+import inspect
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+
+from aiohttp import ClientSession, ClientTimeout
+
+from .milesight_gateway_client import MilesightGatewayClient
+
+# Keys of a gateway dict that are passed to MilesightGatewayClient
+GATEWAY_CLIENT_KEYS = ('username', 'password', 'secret_key', 'iv', 'base_url', 'port')
+
+
+def gateway_name(gateway: dict):
+    """Returns the name of a gateway dict, falling back to its URL."""
+    return gateway.get('name') or f"{gateway.get('base_url')}:{gateway.get('port')}"
+
+
+def create_client(gateway: dict):
+    """Creates a MilesightGatewayClient from a gateway dict, accepting the key and IV as str or bytes."""
+    settings = {key: gateway[key] for key in GATEWAY_CLIENT_KEYS}
+    for key in ('secret_key', 'iv'):
+        if isinstance(settings[key], str):
+            settings[key] = bytes(settings[key], 'utf-8')
+    client = MilesightGatewayClient(**settings)
+    if gateway.get('tuning_config'):
+        client.load_tuning_config(gateway['tuning_config'])
+    return client
+
+
+async def collect_shard(shard, gateways, method, method_kwargs, concurrency, timeout, connection):
+    """Collects one shard of gateways on the event loop of a worker process and sends every result to the parent."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def collect_gateway(session, gateway):
+        result = {'gateway': gateway_name(gateway), 'shard': shard, 'result': None, 'error': None}
+        async with semaphore:
+            try:
+                client = create_client(gateway)
+                await client.get_jwt_token(session)
+                result['result'] = await getattr(client, method)(session, **method_kwargs)
+            except Exception as e:
+                logging.error(f"Error collecting {method} from gateway {result['gateway']}: {e}")
+                result['error'] = str(e)
+        connection.send(('result', shard, result))
+
+    async with ClientSession(timeout=ClientTimeout(total=timeout)) as session:
+        await asyncio.gather(*(collect_gateway(session, gateway) for gateway in gateways))
+
+
+def run_shard(shard, gateways, method, method_kwargs, concurrency, timeout, connection):
+    """Entry point of a worker process."""
+    try:
+        asyncio.run(collect_shard(shard, gateways, method, method_kwargs, concurrency, timeout, connection))
+        connection.send(('done', shard, None))
+    except BaseException as e:
+        connection.send(('failed', shard, f"{type(e).__name__}: {e}"))
+        raise
+    finally:
+        connection.close()
+
+
+def collect_fleet(gateways, method='get_all_devices', method_kwargs=None, processes=None, concurrency=4, timeout=30):
+    """
+    Collects data from many gateways with a pool of worker processes.
+
+    The gateways (dicts with the MilesightGatewayClient arguments and an optional name and tuning_config)
+    are split round robin into one shard per process. Every worker runs its own event loop and clients,
+    calls the given client method on up to concurrency gateways at a time and sends each result back as
+    soon as it is ready over its own pipe, so a crashed worker can't block the others.
+
+    Methods with a strict argument, like get_all_devices, are called with strict=True unless method_kwargs
+    says otherwise, so a gateway that fails mid-pagination reports an error instead of a partial result.
+
+    Yields one dict per gateway with gateway, shard, result and error. If a worker dies, one dict per
+    shard is yielded with gateway None and the error. The workers are stopped when the generator is closed.
+    """
+    if not callable(getattr(MilesightGatewayClient, method, None)):
+        raise ValueError(f"MilesightGatewayClient has no method {method}")
+    method_kwargs = dict(method_kwargs or {})
+    if 'strict' in inspect.signature(getattr(MilesightGatewayClient, method)).parameters:
+        method_kwargs.setdefault('strict', True)
+
+    gateways = list(gateways)
+    if not gateways:
+        return
+    processes = max(1, min(processes or os.cpu_count() or 1, len(gateways)))
+    shards = [gateways[i::processes] for i in range(processes)]
+
+    context = multiprocessing.get_context('spawn')
+    workers = {}
+    connections = {}
+    try:
+        for shard, shard_gateways in enumerate(shards):
+            receiver, sender = context.Pipe(duplex=False)
+            workers[shard] = context.Process(target=run_shard, name=f'milesight-fleet-shard-{shard}', daemon=True,
+                                             args=(shard, shard_gateways, method, method_kwargs, concurrency, timeout, sender))
+            workers[shard].start()
+            # Only the worker keeps the sending end open, so its death shows up as EOF
+            sender.close()
+            connections[receiver] = shard
+        logging.info(f"Collecting {method} from {len(gateways)} gateways with {processes} processes.")
+
+        while connections:
+            for receiver in multiprocessing.connection.wait(list(connections)):
+                shard = connections[receiver]
+                try:
+                    kind, _, payload = receiver.recv()
+                except (EOFError, OSError):
+                    # The worker exited without reporting back
+                    workers[shard].join()
+                    kind, payload = 'failed', f"Shard exited with code {workers[shard].exitcode}"
+
+                if kind == 'result':
+                    yield payload
+                    continue
+
+                del connections[receiver]
+                receiver.close()
+                if kind == 'failed':
+                    logging.error(f"Shard {shard} failed: {payload}")
+                    yield {'gateway': None, 'shard': shard, 'result': None, 'error': payload}
+    finally:
+        for worker in workers.values():
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+        for receiver in connections:
+            receiver.close()
@@ -0,0 +1,226 @@
+"""
+Finds how many parallel read requests a gateway handles before latency degrades.
+
+Runs a ramp of concurrency levels against the devices endpoint, reports p50/p95 latency and
+throughput per level and the knee of the curve, and optionally writes the recommended concurrency
+and page size to a JSON config for MilesightGatewayClient.load_tuning_config.
+
+    milesight-load-probe --base-url https://192.168.2.180 --port 8080 --output tuning.json
+    milesight-load-probe --mock
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+from aiohttp import ClientSession, ClientTimeout, web
+
+from .milesight_gateway_client import MilesightGatewayClient
+
+# A level counts as the knee if it reaches this share of the best throughput
+KNEE_THROUGHPUT_SHARE = 0.9
+
+
+def percentile(values, share):
+    """Returns the value below which the given share of the sorted values falls."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+async def get_device_count(client: MilesightGatewayClient, session: ClientSession):
+    """Returns the devTotalCount of the gateway."""
+    async with session.get(f'{client.url_endpoint_devices}?offset=0&limit=1&applicationID=0', headers=client.headers, ssl=False) as response:
+        response.raise_for_status()
+        data = await response.json()
+        return data.get('devTotalCount', 0)
+
+
+async def probe_level(client: MilesightGatewayClient, session: ClientSession, concurrency, requests, page_size, device_count):
+    """
+    Runs the given number of device page reads with the given concurrency and returns the measurements.
+
+    The requests cycle through the full pages of the device list, so every read returns a full page
+    if the gateway has at least page_size devices, and runs are reproducible.
+    """
+    latencies = []
+    items = 0
+    errors = 0
+    full_pages = max(1, device_count // page_size)
+    queue = iter(range(requests))
+
+    async def worker():
+        nonlocal items, errors
+        for request in queue:
+            offset = (request % full_pages) * page_size
+            started = time.perf_counter()
+            try:
+                async with session.get(f'{client.url_endpoint_devices}?offset={offset}&limit={page_size}&applicationID=0',
+                                       headers=client.headers, ssl=False) as response:
+                    response.raise_for_status()
+                    data = await response.json()
+                    items += len(data.get('deviceResult', []))
+            except Exception as e:
+                errors += 1
+                logging.debug(f"Probe request failed: {e}")
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        'concurrency': concurrency,
+        'page_size': page_size,
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+        'requests_per_s': round(len(latencies) / elapsed, 1),
+        'items_per_s': round(items / elapsed, 1),
+    }
+
+
+def find_knee(results, key='requests_per_s'):
+    """
+    Returns the smallest level that reaches KNEE_THROUGHPUT_SHARE of the best throughput without errors,
+    or None if every level had errors.
+    """
+    usable = [result for result in results if not result['errors']]
+    if not usable:
+        return None
+    best = max(result[key] for result in usable)
+    return next(result for result in usable if result[key] >= KNEE_THROUGHPUT_SHARE * best)
+
+
+async def run_probe(client: MilesightGatewayClient, levels, requests, page_sizes):
+    """
+    Logs in, ramps the concurrency levels and then compares the page sizes at the knee.
+
+    Returns the recommendation, or None if no level worked without errors, and all measurements.
+    """
+    async with ClientSession(timeout=ClientTimeout(total=30)) as session:
+        await client.get_jwt_token(session)
+        device_count = await get_device_count(client, session)
+        print(f"Gateway has {device_count} devices")
+
+        concurrency_results = []
+        for concurrency in levels:
+            result = await probe_level(client, session, concurrency, max(requests, concurrency), page_sizes[0], device_count)
+            concurrency_results.append(result)
+            print_result(result)
+        knee = find_knee(concurrency_results)
+        if knee is None:
+            return None, concurrency_results
+
+        page_size_results = [knee]
+        for page_size in page_sizes[1:]:
+            if page_size > device_count:
+                print(f"Skipping page size {page_size}, the gateway has only {device_count} devices")
+                continue
+            result = await probe_level(client, session, knee['concurrency'], max(requests, knee['concurrency']), page_size, device_count)
+            page_size_results.append(result)
+            print_result(result)
+        best_page = find_knee(page_size_results, key='items_per_s') or knee
+
+    return {'concurrency': knee['concurrency'], 'page_size': best_page['page_size']}, concurrency_results + page_size_results[1:]
+
+
+def print_result(result):
+    print(f"concurrency {result['concurrency']:>4}  page size {result['page_size']:>4}  "
+          f"p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  "
+          f"{result['requests_per_s']} req/s  {result['items_per_s']} devices/s  errors {result['errors']}")
+
+
+async def start_mock_gateway(port, capacity=4, service_time=0.02, devices=500):
+    """Starts a local mock gateway that serves at most capacity requests at a time."""
+    slots = asyncio.Semaphore(capacity)
+    device_list = [{'devEUI': f'{i:016X}', 'name': f'device-{i}', 'appName': 'mock'} for i in range(devices)]
+
+    async def login(request):
+        return web.json_response({'jwt': 'mock'})
+
+    async def get_devices(request):
+        offset = int(request.query.get('offset', 0))
+        limit = int(request.query.get('limit', 10))
+        async with slots:
+            await asyncio.sleep(service_time + limit * 0.0002)
+        return web.json_response({'deviceResult': device_list[offset:offset + limit], 'devTotalCount': devices})
+
+    app = web.Application()
+    app.router.add_post('/api/internal/login', login)
+    app.router.add_get('/api/urdevices', get_devices)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return runner
+
+
+def parse_int_list(value):
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='milesight-load-probe', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--base-url', default=os.getenv('BASE_URL'), help="Gateway URL, e.g. https://192.168.2.180 (env BASE_URL)")
+    parser.add_argument('--port', default=os.getenv('PORT'), help="Gateway port (env PORT)")
+    parser.add_argument('--username', default=os.getenv('USERNAME'), help="Login user (env USERNAME)")
+    parser.add_argument('--password', default=os.getenv('PASSWORD'), help="Login password (env PASSWORD)")
+    parser.add_argument('--secret-key', default=os.getenv('SECRET_KEY'), help="AES key for the password (env SECRET_KEY)")
+    parser.add_argument('--iv', default=os.getenv('IV'), help="AES IV for the password (env IV)")
+    parser.add_argument('--levels', type=parse_int_list, default=[1, 2, 4, 8, 16, 32], help="Concurrency levels, default 1,2,4,8,16,32")
+    parser.add_argument('--requests', type=int, default=50, help="Requests per level, default 50")
+    parser.add_argument('--page-sizes', type=parse_int_list, default=[10, 50, 100],
+                        help="Page sizes, the first is used for the concurrency ramp, default 10,50,100")
+    parser.add_argument('--output', help="Write the recommended concurrency and page size to this JSON file")
+    parser.add_argument('--mock', action='store_true', help="Probe a local mock gateway instead")
+    parser.add_argument('--mock-port', type=int, default=8765, help="Port of the local mock gateway, default 8765")
+    return parser.parse_args(argv)
+
+
+async def main_async(args):
+    runner = None
+    if args.mock:
+        runner = await start_mock_gateway(args.mock_port)
+        args.base_url, args.port = 'http://127.0.0.1', args.mock_port
+        args.username, args.password = args.username or 'admin', args.password or 'mock'
+        args.secret_key, args.iv = '1111111111111111', '2222222222222222'
+
+    missing = [name for name in ('base_url', 'port', 'username', 'password', 'secret_key', 'iv') if not getattr(args, name)]
+    if missing:
+        raise SystemExit(f"Missing settings: {', '.join(missing)}")
+
+    client = MilesightGatewayClient(args.username, args.password, bytes(args.secret_key, 'utf-8'),
+                                    bytes(args.iv, 'utf-8'), args.base_url, args.port)
+    try:
+        recommendation, results = await run_probe(client, args.levels, args.requests, args.page_sizes)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+
+    if recommendation is None:
+        print("No concurrency level worked without errors, no recommendation")
+        if args.output:
+            print(f"Config not saved to {args.output}")
+        raise SystemExit(1)
+
+    print(f"Recommended: concurrency {recommendation['concurrency']}, page size {recommendation['page_size']}")
+    if args.output:
+        with open(args.output, mode='w', encoding='utf-8') as config_file:
+            json.dump({**recommendation, 'results': results}, config_file, indent=4)
+        print(f"Config saved to {args.output}")
+    return recommendation
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if sys.platform.startswith('win'):
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,70 @@
+import asyncio
 import base64
+import csv
+import json
 import logging
+import re
 
 import urllib3
 from aiohttp import ClientSession, ClientTimeout
-from aiohttp.client_exceptions import ClientError
+from aiohttp.client_exceptions import ClientConnectionError, ClientError, ClientResponseError
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad
 
+from .device_table import device_table_from_pages
+
 # Disable insecure request warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# CSV columns as written by examples/export_devices.py, mapped to the device fields of the API
+DEVICE_CSV_COLUMNS = {
+    'name': 'name',
+    'description': 'description',
+    'devEUI': 'devEUI',
+    'deviceprofile': 'profileName',
+    'application': 'appName',
+    'payloadcodec': 'payloadName',
+    'fport': 'fPort',
+    'appkey': 'appKey',
+    'devaddr': 'devAddr',
+    'nwkskey': 'nwkSKey',
+    'appskey': 'appSKey',
+}
+
+# Key fields of the CSV and their length in hex digits. The export writes placeholders for some of them,
+# so values that aren't hex of this length are ignored
+DEVICE_CSV_HEX_FIELDS = {
+    'appKey': 32,
+    'devAddr': 8,
+    'nwkSKey': 32,
+    'appSKey': 32,
+}
+
+# Device fields sent to the gateway when creating or updating a device
+DEVICE_WRITE_FIELDS = (
+    'name', 'description', 'devEUI', 'profileID', 'applicationID', 'payloadCodecID',
+    'fPort', 'appKey', 'devAddr', 'nwkSKey', 'appSKey',
+)
+
+# HTTP status codes worth retrying a write request for
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+async def gather_or_cancel(*aws):
+    """Like asyncio.gather, but cancels the other awaitables as soon as one of them raises."""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
 class MilesightGatewayClient:
     def __init__(self, username, password, secret_key, iv, base_url, port):
         self.username = username
@@ -33,6 +85,18 @@ class MilesightGatewayClient:
         self.url_endpoint_get_gateway_fleet = f"{base_url}:{port}/api/gateways"
         self.jwt_token = None
         self.headers = None
+        self.profile_catalogue = {}
+        # Tuning, see load_tuning_config
+        self.concurrency = None
+        self.page_size = None
+
+    def load_tuning_config(self, file_path):
+        """Loads the concurrency and page size recommended by the milesight-load-probe CLI."""
+        with open(file_path, mode='r', encoding='utf-8') as config_file:
+            config = json.load(config_file)
+        self.concurrency = config.get('concurrency', self.concurrency)
+        self.page_size = config.get('page_size', self.page_size)
+        logging.debug(f"Loaded tuning config: concurrency {self.concurrency}, page size {self.page_size}.")
 
     def encrypt_password(self, plain_text_password):
         """Encrypts the password using AES."""
@@ -83,12 +147,25 @@ class MilesightGatewayClient:
             logging.error(f"Error fetching device: {e}")
             raise
 
-    async def get_all_devices(self, session: ClientSession, limit=10):
-        """Asynchronously fetches all devices using pagination."""
-        offset = 0
+    async def get_all_devices(self, session: ClientSession, limit=None, strict=False):
+        """Asynchronously fetches all devices using pagination. With strict=True errors are raised instead of returning the pages fetched so far."""
         all_devices = []
         dev_total_count = 0
 
+        try:
+            async for devices, dev_total_count in self.iter_device_pages(session, limit=limit):
+                all_devices.extend(devices)
+        except Exception:
+            if strict:
+                raise
+
+        return all_devices, dev_total_count
+
+    async def iter_device_pages(self, session: ClientSession, limit=None):
+        """Asynchronously yields all devices page by page, together with the devTotalCount. Errors are raised."""
+        limit = limit or self.page_size or 10
+        offset = 0
+
         while True:
             try:
                 async with session.get(f'{self.url_endpoint_devices}?offset={offset}&limit={limit}&applicationID=0', headers=self.headers, ssl=False) as response:
@@ -96,25 +173,33 @@ class MilesightGatewayClient:
                     data = await response.json()
                     devices = data.get('deviceResult', [])
                     dev_total_count = data.get('devTotalCount', 0)
-
-                    if not devices:
-                        break
-
-                    all_devices.extend(devices)
-                    offset += limit
-
-                    if len(devices) < limit:
-                        break
-
-                    logging.debug(f"Fetched {len(devices)} devices (offset: {offset})")
             except ClientError as e:
                 logging.error(f"Client error occurred while fetching devices: {e}")
-                break
+                raise
             except Exception as e:
                 logging.error(f"Error fetching devices: {e}")
+                raise
+
+            if not devices:
                 break
 
-        return all_devices, dev_total_count
+            yield devices, dev_total_count
+            offset += limit
+
+            if len(devices) < limit:
+                break
+
+            logging.debug(f"Fetched {len(devices)} devices (offset: {offset})")
+
+    async def get_device_table(self, session: ClientSession, limit=None, gateway: str = None):
+        """
+        Asynchronously fetches all devices into a columnar pyarrow table.
+
+        appName, profileName and payloadName are dictionary-encoded. A failed page is raised, so the
+        table never silently misses devices. Requires the optional pyarrow dependency.
+        """
+        pages = (devices async for devices, _ in self.iter_device_pages(session, limit=limit or self.page_size or 100))
+        return await device_table_from_pages(pages, gateway=gateway)
 
     async def get_packet_forwarder_info(self, session: ClientSession):
         """Asynchronously fetches packet forwarder information from the gateway."""
@@ -147,8 +232,8 @@ class MilesightGatewayClient:
             logging.error(f"Error fetching network server settings: {e}")
             raise
 
-    async def get_all_applications(self, session: ClientSession, limit=2):
-        """Asynchronously fetches all applications using pagination."""
+    async def get_all_applications(self, session: ClientSession, limit=2, strict=False):
+        """Asynchronously fetches all applications using pagination. With strict=True errors are raised instead of returning the pages fetched so far."""
         offset = 0
         all_applications = []
         total_count = 0
@@ -173,9 +258,13 @@ class MilesightGatewayClient:
                     logging.debug(f"Fetched {len(applications)} applications (offset: {offset})")
             except ClientError as e:
                 logging.error(f"Client error occurred while fetching applications: {e}")
+                if strict:
+                    raise
                 break
             except Exception as e:
                 logging.error(f"Error fetching applications: {e}")
+                if strict:
+                    raise
                 break
 
         return all_applications, total_count
@@ -189,6 +278,13 @@ class MilesightGatewayClient:
                 data = await response.json()
                 logging.debug(f"Successfully retrieved data transmission integration for app ID {app_id} and type {data_transmission_type}.")
                 return data
+        except ClientResponseError as e:
+            # The gateway answers 404 for an integration that isn't configured
+            if e.status == 404:
+                logging.debug(f"No {data_transmission_type} integration configured for app ID {app_id}.")
+            else:
+                logging.error(f"Client error occurred while fetching data transmission integration: {e}")
+            raise
         except ClientError as e:
             logging.error(f"Client error occurred while fetching data transmission integration: {e}")
             raise
@@ -196,8 +292,8 @@ class MilesightGatewayClient:
             logging.error(f"Error fetching data transmission integration: {e}")
             raise
 
-    async def get_payload_codecs(self, session: ClientSession, codec_type: str, limit=10, search: str = None):
-        """Asynchronously fetches payload codecs using pagination with an optional search parameter."""
+    async def get_payload_codecs(self, session: ClientSession, codec_type: str, limit=10, search: str = None, strict=False):
+        """Asynchronously fetches payload codecs using pagination with an optional search parameter. With strict=True errors are raised instead of returning the pages fetched so far."""
         offset = 0
         all_codecs = []
         total_count = 0
@@ -227,9 +323,13 @@ class MilesightGatewayClient:
                     logging.debug(f"Fetched {len(codecs)} codecs (offset: {offset}, search: {search})")
             except ClientError as e:
                 logging.error(f"Client error occurred while fetching payload codecs: {e}")
+                if strict:
+                    raise
                 break
             except Exception as e:
                 logging.error(f"Error fetching payload codecs: {e}")
+                if strict:
+                    raise
                 break
 
         return all_codecs, total_count
@@ -285,8 +385,8 @@ class MilesightGatewayClient:
             logging.error(f"Error fetching payload codecs for ID {codec_id}: {e}")
             raise
 
-    async def get_profiles(self, session: ClientSession, organization_id: str, application_id: str, limit=10, profile_id: str = None):
-        """Asynchronously fetches profiles using pagination with optional profileID."""
+    async def get_profiles(self, session: ClientSession, organization_id: str, application_id: str, limit=10, profile_id: str = None, strict=False):
+        """Asynchronously fetches profiles using pagination with optional profileID. With strict=True errors are raised instead of returning the pages fetched so far."""
         offset = 0
         all_profiles = []
         total_count = 0
@@ -316,13 +416,52 @@ class MilesightGatewayClient:
                     logging.debug(f"Fetched {len(profiles)} profiles (offset: {offset}, profileID: {profile_id})")
             except ClientError as e:
                 logging.error(f"Client error occurred while fetching profiles: {e}")
+                if strict:
+                    raise
                 break
             except Exception as e:
                 logging.error(f"Error fetching profiles: {e}")
+                if strict:
+                    raise
                 break
 
         return all_profiles, total_count
 
+    async def get_profile_catalogue(self, session: ClientSession, organization_id: str, limit=10, refresh=False):
+        """
+        Asynchronously fetches the profiles of all applications concurrently, de-duplicated by profileID.
+
+        The catalogue is cached per organization_id. Fetch errors are raised and nothing is cached,
+        and a catalogue whose counts don't match the totalCount of the gateway is returned but not cached.
+        """
+        cached = self.profile_catalogue.get(organization_id)
+        if cached is not None and not refresh:
+            logging.debug(f"Using cached profile catalogue of organizationID {organization_id} with {len(cached)} profiles.")
+            return cached, len(cached)
+
+        applications, app_total_count = await self.get_all_applications(session, strict=True)
+        app_ids = [app.get('applicationID') for app in applications if app.get('applicationID') is not None]
+
+        results = await asyncio.gather(
+            *(self.get_profiles(session, organization_id, app_id, limit=limit, strict=True) for app_id in app_ids)
+        )
+
+        catalogue = {}
+        complete = len(applications) == app_total_count
+        for profiles, total_count in results:
+            complete = complete and len(profiles) == total_count
+            for profile in profiles:
+                profile_id = profile.get('profileID')
+                if profile_id and profile_id not in catalogue:
+                    catalogue[profile_id] = profile
+
+        if complete:
+            self.profile_catalogue[organization_id] = catalogue
+        else:
+            logging.warning(f"Profile catalogue of organizationID {organization_id} is incomplete and was not cached.")
+        logging.debug(f"Built profile catalogue with {len(catalogue)} profiles from {len(app_ids)} applications.")
+        return catalogue, len(catalogue)
+
     async def get_gateway_fleet(self, session: ClientSession, organization_id: str, search: str = None):
         """Asynchronously fetches the gateway fleet with optional search by name or gateway ID."""
         offset = 0
@@ -347,3 +486,288 @@ class MilesightGatewayClient:
         except Exception as e:
             logging.error(f"Error fetching gateway fleet: {e}")
             raise
+
+    async def get_gateway_snapshot(self, session: ClientSession, organization_id: str = "1",
+                                   integration_types=('http', 'mqtt'), codec_types=('default', 'custom')):
+        """
+        Asynchronously fetches a linked snapshot of the gateway.
+
+        Independent requests run concurrently and the per-application integrations and profiles are
+        requested as soon as the applications arrive. Returns a dict with the packet forwarder info,
+        network server settings, payload codecs by ID, devices that belong to no known application, and
+        the applications, each with its integrations by type, profiles and devices. Every device carries
+        its payload codec under 'payloadCodec'.
+
+        Integrations the gateway answers with 404 are None. Any other error is raised and the
+        requests still running are cancelled.
+        """
+        async def fetch_integration(app_id, data_transmission_type):
+            try:
+                return await self.get_data_transmission_integration(session, app_id, data_transmission_type)
+            except ClientResponseError as e:
+                # Not every application has every integration configured
+                if e.status == 404:
+                    return None
+                raise
+
+        async def fetch_application(app):
+            app_id = app.get('applicationID')
+            integrations, (profiles, _) = await gather_or_cancel(
+                gather_or_cancel(*(fetch_integration(app_id, t) for t in integration_types)),
+                self.get_profiles(session, organization_id, app_id, strict=True),
+            )
+            return {**app, 'integrations': dict(zip(integration_types, integrations)), 'profiles': profiles, 'devices': []}
+
+        async def fetch_applications():
+            applications, _ = await self.get_all_applications(session, strict=True)
+            return await gather_or_cancel(*(fetch_application(app) for app in applications))
+
+        applications, (devices, _), codec_results, (packet_forwarder, _), network_server_settings = await gather_or_cancel(
+            fetch_applications(),
+            self.get_all_devices(session, limit=self.page_size or 100, strict=True),
+            gather_or_cancel(*(self.get_payload_codecs(session, codec_type, limit=self.page_size or 100, strict=True) for codec_type in codec_types)),
+            self.get_packet_forwarder_info(session),
+            self.get_network_server_settings(session),
+        )
+
+        payload_codecs = {}
+        for codecs, _ in codec_results:
+            payload_codecs.update({str(codec.get('id')): codec for codec in codecs})
+
+        apps_by_id = {str(app.get('applicationID')): app for app in applications}
+        apps_by_name = {app.get('name'): app for app in applications}
+        unassigned_devices = []
+        for device in devices:
+            device = {**device, 'payloadCodec': payload_codecs.get(str(device.get('payloadCodecID')))}
+            app = apps_by_id.get(str(device.get('applicationID'))) or apps_by_name.get(device.get('appName'))
+            if app is not None:
+                app['devices'].append(device)
+            else:
+                unassigned_devices.append(device)
+
+        logging.debug(f"Built gateway snapshot with {len(applications)} applications and {len(devices)} devices.")
+        return {
+            'packet_forwarder': packet_forwarder,
+            'network_server_settings': network_server_settings,
+            'payload_codecs': payload_codecs,
+            'applications': applications,
+            'unassigned_devices': unassigned_devices,
+        }
+
+    async def create_device(self, session: ClientSession, device: dict):
+        """Asynchronously creates a device on the gateway."""
+        try:
+            async with session.post(self.url_endpoint_devices, json=device, headers=self.headers, ssl=False) as response:
+                response.raise_for_status()
+                logging.debug(f"Successfully created device {device.get('devEUI')}.")
+                return await response.json(content_type=None)
+        except ClientError as e:
+            logging.error(f"Client error occurred while creating device {device.get('devEUI')}: {e}")
+            raise
+        except Exception as e:
+            logging.error(f"Error creating device {device.get('devEUI')}: {e}")
+            raise
+
+    async def update_device(self, session: ClientSession, device: dict):
+        """Asynchronously updates an existing device identified by its devEUI."""
+        try:
+            url = f"{self.url_endpoint_devices}/{device['devEUI']}"
+            async with session.put(url, json=device, headers=self.headers, ssl=False) as response:
+                response.raise_for_status()
+                logging.debug(f"Successfully updated device {device['devEUI']}.")
+                return await response.json(content_type=None)
+        except ClientError as e:
+            logging.error(f"Client error occurred while updating device {device.get('devEUI')}: {e}")
+            raise
+        except Exception as e:
+            logging.error(f"Error updating device {device.get('devEUI')}: {e}")
+            raise
+
+    async def delete_device(self, session: ClientSession, dev_eui: str):
+        """Asynchronously deletes a device by its devEUI."""
+        try:
+            async with session.delete(f'{self.url_endpoint_devices}/{dev_eui}', headers=self.headers, ssl=False) as response:
+                response.raise_for_status()
+                logging.debug(f"Successfully deleted device {dev_eui}.")
+                return await response.json(content_type=None)
+        except ClientError as e:
+            logging.error(f"Client error occurred while deleting device {dev_eui}: {e}")
+            raise
+        except Exception as e:
+            logging.error(f"Error deleting device {dev_eui}: {e}")
+            raise
+
+    async def device_exists(self, session: ClientSession, dev_eui: str):
+        """Asynchronously checks whether a device with the given devEUI exists on the gateway."""
+        try:
+            devices = await self.get_device(session, dev_eui)
+        except (ClientError, asyncio.TimeoutError):
+            return False
+        return any(d.get('devEUI', '').upper() == dev_eui.upper() for d in devices)
+
+    @staticmethod
+    def read_devices_csv(file_path):
+        """Reads devices from a CSV file in the layout written by save_devices_to_csv."""
+        devices = []
+        with open(file_path, mode='r', newline='', encoding='utf-8') as csv_file:
+            for row in csv.DictReader(csv_file):
+                device = {}
+                for column, field in DEVICE_CSV_COLUMNS.items():
+                    value = (row.get(column) or '').strip()
+                    # The export writes '-' for empty values
+                    if not value or value == '-':
+                        continue
+                    if field in DEVICE_CSV_HEX_FIELDS and (len(value) != DEVICE_CSV_HEX_FIELDS[field] or not re.fullmatch('[0-9A-Fa-f]+', value)):
+                        continue
+                    device[field] = int(value) if field == 'fPort' else value
+                if device.get('devEUI'):
+                    devices.append(device)
+        return devices
+
+    async def resolve_device_ids(self, session: ClientSession, devices, organization_id: str):
+        """Fills in applicationID, profileID and payloadCodecID from appName, profileName and payloadName."""
+        def needs(id_field, name_field):
+            return any(d.get(name_field) and not d.get(id_field) for d in devices)
+
+        app_ids, profile_ids, codec_ids = {}, {}, {}
+
+        if needs('applicationID', 'appName'):
+            applications, _ = await self.get_all_applications(session)
+            app_ids = {app.get('name'): app.get('applicationID') for app in applications}
+        if needs('profileID', 'profileName'):
+            catalogue, _ = await self.get_profile_catalogue(session, organization_id)
+            profile_ids = {profile.get('profileName'): profile_id for profile_id, profile in catalogue.items()}
+        if needs('payloadCodecID', 'payloadName'):
+            for codec_type in ('default', 'custom'):
+                codecs, _ = await self.get_payload_codecs_short(session, codec_type)
+                codec_ids.update({codec.get('name'): codec.get('id') for codec in codecs})
+
+        for device in devices:
+            for id_field, name_field, ids in (('applicationID', 'appName', app_ids),
+                                              ('profileID', 'profileName', profile_ids),
+                                              ('payloadCodecID', 'payloadName', codec_ids)):
+                if device.get(name_field) and not device.get(id_field):
+                    if device[name_field] not in ids:
+                        raise ValueError(f"Unknown {name_field} '{device[name_field]}' for device {device.get('devEUI')}")
+                    device[id_field] = ids[device[name_field]]
+        return devices
+
+    async def bulk_create_devices(self, session: ClientSession, devices, organization_id: str = "1", **kwargs):
+        """Asynchronously creates many devices, skipping those that already exist on the gateway."""
+        return await self.bulk_provision_devices(session, 'create', devices, organization_id, **kwargs)
+
+    async def bulk_update_devices(self, session: ClientSession, devices, organization_id: str = "1", **kwargs):
+        """Asynchronously updates many devices, only sending those whose fields differ from the gateway."""
+        return await self.bulk_provision_devices(session, 'update', devices, organization_id, **kwargs)
+
+    async def bulk_delete_devices(self, session: ClientSession, devices, **kwargs):
+        """Asynchronously deletes many devices (dicts with a devEUI or plain devEUI strings)."""
+        devices = [{'devEUI': d} if isinstance(d, str) else d for d in devices]
+        return await self.bulk_provision_devices(session, 'delete', devices, **kwargs)
+
+    async def bulk_provision_devices(self, session: ClientSession, action: str, devices, organization_id: str = "1",
+                                     concurrency=None, rate_limit=None, retries=3, backoff=0.5, dry_run=False):
+        """
+        Asynchronously creates, updates or deletes many devices.
+
+        The requested devices are diffed against get_all_devices first, so only necessary changes are sent.
+        Requests run with bounded concurrency, optionally limited to rate_limit requests per second, and
+        transient failures are retried. With dry_run=True the planned changes are returned without sending them.
+
+        Returns a list with one result dict per device: devEUI, action and status
+        ('created', 'updated', 'deleted', 'unchanged', 'exists', 'missing', 'planned' or 'failed') plus error.
+        """
+        if action not in ('create', 'update', 'delete'):
+            raise ValueError(f"Unknown bulk action: {action}")
+
+        devices = [dict(device) for device in devices]
+        if action != 'delete':
+            await self.resolve_device_ids(session, devices, organization_id)
+
+        current_devices, dev_total_count = await self.get_all_devices(session, limit=self.page_size or 100, strict=True)
+        if len(current_devices) != dev_total_count:
+            raise RuntimeError(f"Fetched {len(current_devices)} of {dev_total_count} devices, not planning against an incomplete device list")
+        current = {d.get('devEUI', '').upper(): d for d in current_devices}
+
+        results = []
+        pending = []
+        for device in devices:
+            dev_eui = device.get('devEUI', '')
+            existing = current.get(dev_eui.upper())
+            result = {'devEUI': dev_eui, 'action': action, 'status': None, 'error': None}
+            results.append(result)
+
+            if action == 'create' and existing:
+                result['status'] = 'exists'
+            elif action != 'create' and not existing:
+                result['status'] = 'missing'
+            elif action == 'update' and not any(str(existing.get(k)) != str(device[k]) for k in DEVICE_WRITE_FIELDS if k in device):
+                result['status'] = 'unchanged'
+            elif dry_run:
+                result['status'] = 'planned'
+            else:
+                if action == 'create':
+                    payload = {k: device[k] for k in DEVICE_WRITE_FIELDS if k in device}
+                elif action == 'update':
+                    merged = {**existing, **device}
+                    payload = {k: merged[k] for k in DEVICE_WRITE_FIELDS if k in merged}
+                else:
+                    payload = dev_eui
+                pending.append((result, payload))
+
+        semaphore = asyncio.Semaphore(concurrency or self.concurrency or 5)
+        rate_lock = asyncio.Lock()
+        next_slot = [0.0]
+
+        async def wait_for_rate_limit():
+            if not rate_limit:
+                return
+            loop = asyncio.get_running_loop()
+            async with rate_lock:
+                delay = next_slot[0] - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                next_slot[0] = max(next_slot[0], loop.time()) + 1 / rate_limit
+
+        async def send(result, payload):
+            async with semaphore:
+                for attempt in range(retries + 1):
+                    await wait_for_rate_limit()
+                    try:
+                        if action == 'create':
+                            await self.create_device(session, payload)
+                        elif action == 'update':
+                            await self.update_device(session, payload)
+                        else:
+                            await self.delete_device(session, payload)
+                        result['status'], result['error'] = action + 'd', None
+                        return
+                    except ClientResponseError as e:
+                        if action == 'delete' and e.status == 404:
+                            result['status'] = 'deleted'
+                            return
+                        result['error'] = str(e)
+                        retryable = e.status in RETRY_STATUS_CODES
+                    except (ClientConnectionError, asyncio.TimeoutError) as e:
+                        result['error'] = str(e)
+                        retryable = True
+                    except Exception as e:
+                        result['error'] = str(e)
+                        retryable = False
+
+                    # A create may have reached the gateway even though the response failed
+                    if action == 'create' and await self.device_exists(session, result['devEUI']):
+                        result['status'], result['error'] = 'created', None
+                        return
+                    if not retryable:
+                        break
+                    if attempt < retries:
+                        await asyncio.sleep(backoff * 2 ** attempt)
+
+                result['status'] = 'failed'
+
+        await asyncio.gather(*(send(result, payload) for result, payload in pending))
+
+        failed = sum(1 for result in results if result['status'] == 'failed')
+        logging.info(f"Bulk {action} of {len(results)} devices: {len(pending)} sent, {failed} failed, dry_run: {dry_run}.")
+        return results
@@ -9,6 +9,14 @@ setup(
         "pycryptodome",
         "urllib3",
     ],
+    extras_require={                       # Optional dependencies
+        "columnar": ["pyarrow>=7"],        # Columnar device table
+    },
+    entry_points={                         # Command line tools
+        "console_scripts": [
+            "milesight-load-probe=milesight_gateway_api.load_probe:main",
+        ],
+    },
     author="Stefan Knaak",                    
     author_email="stefan.knaak@e-shelter.io", 
     description="A python client for interacting with Milesight gateway REST API",  
@@ -0,0 +1,144 @@
+import asyncio
+import sys
+import os
+
+from aiohttp import ClientSession, web
+
+# Add project root directory to PYTHONPATH to load the class from file and not from pip
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from milesight_gateway_api.milesight_gateway_client import MilesightGatewayClient
+
+
+class MockGateway:
+    """In-memory Milesight gateway with the endpoints used by the tests."""
+
+    def __init__(self, devices=None, applications=None, profiles=None, codecs=None, integrations=None):
+        self.devices = {d['devEUI']: dict(d) for d in (devices or [])}
+        self.applications = applications or []
+        self.profiles = profiles or {}
+        self.codecs = codecs or {'default': [], 'custom': []}
+        # Integrations by (applicationID, type), missing ones are answered with 404
+        self.integrations = integrations or {}
+        # Seconds to wait before answering, per "METHOD path" key
+        self.delays = {}
+        self.requests = []
+        # Status codes returned instead of handling the request, per "METHOD path" key, None passes one request through
+        self.failures = {}
+        # Status codes returned after the request was handled, per "METHOD path" key
+        self.failures_after = {}
+        self.runner = None
+        self.port = None
+
+    def fail(self, key, *statuses, after_handling=False):
+        failures = self.failures_after if after_handling else self.failures
+        failures.setdefault(key, []).extend(statuses)
+
+    @web.middleware
+    async def record(self, request, handler):
+        key = f"{request.method} {request.path}"
+        self.requests.append((key, dict(request.query), await request.json() if request.can_read_body else None))
+        if self.delays.get(key):
+            await asyncio.sleep(self.delays[key])
+        if self.failures.get(key):
+            status = self.failures[key].pop(0)
+            if status is not None:
+                return web.Response(status=status)
+        response = await handler(request)
+        if self.failures_after.get(key):
+            return web.Response(status=self.failures_after[key].pop(0))
+        return response
+
+    async def login(self, request):
+        return web.json_response({'jwt': 'mock'})
+
+    async def get_devices(self, request):
+        devices = list(self.devices.values())
+        if 'search' in request.query:
+            return web.json_response({'deviceResult': [d for d in devices if request.query['search'] in d['devEUI']]})
+        offset, limit = int(request.query['offset']), int(request.query['limit'])
+        return web.json_response({'deviceResult': devices[offset:offset + limit], 'devTotalCount': len(devices)})
+
+    async def create_device(self, request):
+        device = await request.json()
+        self.devices[device['devEUI']] = device
+        return web.json_response({})
+
+    async def update_device(self, request):
+        self.devices[request.match_info['dev_eui']].update(await request.json())
+        return web.json_response({})
+
+    async def delete_device(self, request):
+        if self.devices.pop(request.match_info['dev_eui'], None) is None:
+            return web.Response(status=404)
+        return web.json_response({})
+
+    async def get_applications(self, request):
+        offset, limit = int(request.query['offset']), int(request.query['limit'])
+        return web.json_response({'result': self.applications[offset:offset + limit], 'totalCount': len(self.applications)})
+
+    async def get_profiles(self, request):
+        profiles = self.profiles.get(request.query['applicationID'], [])
+        offset, limit = int(request.query['offset']), int(request.query['limit'])
+        return web.json_response({'result': profiles[offset:offset + limit], 'totalCount': len(profiles)})
+
+    async def get_codecs_short(self, request):
+        codecs = self.codecs.get(request.query['type'], [])
+        return web.json_response({'result': codecs, 'totalCount': len(codecs)})
+
+    async def get_codecs(self, request):
+        codecs = self.codecs.get(request.query['type'], [])
+        offset, limit = int(request.query['offset']), int(request.query['limit'])
+        return web.json_response({'result': codecs[offset:offset + limit], 'totalCount': len(codecs)})
+
+    async def get_integration(self, request):
+        integration = self.integrations.get((request.match_info['app_id'], request.match_info['type']))
+        if integration is None:
+            return web.Response(status=404)
+        return web.json_response(integration)
+
+    async def get_packet_forwarder(self, request):
+        return web.json_response({'servs': [{'name': 'local'}]})
+
+    async def get_network_server_settings(self, request):
+        return web.json_response({'enabled': True})
+
+    async def start(self, port=0):
+        app = web.Application(middlewares=[self.record])
+        app.router.add_post('/api/internal/login', self.login)
+        app.router.add_get('/api/urdevices', self.get_devices)
+        app.router.add_post('/api/urdevices', self.create_device)
+        app.router.add_put('/api/urdevices/{dev_eui}', self.update_device)
+        app.router.add_delete('/api/urdevices/{dev_eui}', self.delete_device)
+        app.router.add_get('/api/urapplications', self.get_applications)
+        app.router.add_get('/api/urprofiles', self.get_profiles)
+        app.router.add_get('/api/payloadcodecs-short', self.get_codecs_short)
+        app.router.add_get('/api/payloadcodecs', self.get_codecs)
+        app.router.add_get('/api/urapplications/{app_id}/integrations/{type}', self.get_integration)
+        app.router.add_get('/api/packet-forwarder/network-servers', self.get_packet_forwarder)
+        app.router.add_get('/api/network-server/settings', self.get_network_server_settings)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', port)
+        await site.start()
+        self.port = self.runner.addresses[0][1]
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    def client(self):
+        return MilesightGatewayClient('admin', 'password', b'1111111111111111', b'2222222222222222', 'http://127.0.0.1', self.port)
+
+
+def run_with_gateway(gateway: MockGateway, test):
+    """Starts the mock gateway and runs test(client, session) on a fresh event loop."""
+    async def run():
+        await gateway.start()
+        try:
+            client = gateway.client()
+            async with ClientSession() as session:
+                await client.get_jwt_token(session)
+                return await test(client, session)
+        finally:
+            await gateway.stop()
+    return asyncio.run(run())
@@ -0,0 +1,160 @@
+import importlib.util
+import os
+import time
+
+import pytest
+from aiohttp.client_exceptions import ClientResponseError
+
+from conftest import MockGateway, run_with_gateway
+
+APP_KEY = '0123456789ABCDEF0123456789ABCDEF'
+
+
+def make_gateway(devices=None):
+    return MockGateway(
+        devices=devices if devices is not None else [{
+            'devEUI': 'AA01', 'name': 'one', 'fPort': 85, 'appKey': APP_KEY,
+            'applicationID': '1', 'appName': 'app', 'profileID': 'p1', 'profileName': 'Profile',
+            'payloadCodecID': '3', 'payloadName': 'codec',
+        }],
+        applications=[{'applicationID': '1', 'name': 'app'}],
+        profiles={'1': [{'profileID': 'p1', 'profileName': 'Profile'}]},
+        codecs={'default': [{'id': '3', 'name': 'codec'}], 'custom': []},
+    )
+
+
+def writes(gateway, method):
+    return [body for key, _, body in gateway.requests if key.startswith(f'{method} /api/urdevices')]
+
+
+def statuses(results):
+    return {result['devEUI']: result['status'] for result in results}
+
+
+def test_dry_run_plans_only_necessary_changes():
+    gateway = make_gateway()
+
+    async def test(client, session):
+        created = await client.bulk_create_devices(session, [{'devEUI': 'AA01'}, {'devEUI': 'BB02', 'name': 'two'}], dry_run=True)
+        updated = await client.bulk_update_devices(session, [{'devEUI': 'AA01', 'name': 'one'}, {'devEUI': 'AA01', 'name': 'new'}], dry_run=True)
+        deleted = await client.bulk_delete_devices(session, ['ZZ99', 'AA01'], dry_run=True)
+        return created, updated, deleted
+
+    created, updated, deleted = run_with_gateway(gateway, test)
+    assert statuses(created) == {'AA01': 'exists', 'BB02': 'planned'}
+    assert [result['status'] for result in updated] == ['unchanged', 'planned']
+    assert statuses(deleted) == {'ZZ99': 'missing', 'AA01': 'planned'}
+    assert not writes(gateway, 'POST') + writes(gateway, 'PUT') + writes(gateway, 'DELETE')
+
+
+def test_update_sends_merged_device():
+    gateway = make_gateway()
+
+    async def test(client, session):
+        return await client.bulk_update_devices(session, [{'devEUI': 'AA01', 'name': 'new'}])
+
+    assert statuses(run_with_gateway(gateway, test)) == {'AA01': 'updated'}
+    body = writes(gateway, 'PUT')[0]
+    assert body['name'] == 'new' and body['profileID'] == 'p1' and body['fPort'] == 85
+    assert 'profileName' not in body
+
+
+def test_update_adding_a_field_is_sent():
+    gateway = make_gateway(devices=[{'devEUI': 'AA01', 'name': 'one'}])
+
+    async def test(client, session):
+        return await client.bulk_update_devices(session, [{'devEUI': 'AA01', 'description': 'new desc'}])
+
+    assert statuses(run_with_gateway(gateway, test)) == {'AA01': 'updated'}
+    assert len(writes(gateway, 'PUT')) == 1
+    assert gateway.devices['AA01']['description'] == 'new desc'
+
+
+def test_delete_not_found_counts_as_deleted():
+    gateway = make_gateway()
+    gateway.fail('DELETE /api/urdevices/AA01', 404)
+
+    async def test(client, session):
+        return await client.bulk_delete_devices(session, ['AA01'])
+
+    assert statuses(run_with_gateway(gateway, test)) == {'AA01': 'deleted'}
+
+
+def test_unavailable_is_retried():
+    gateway = make_gateway()
+    gateway.fail('POST /api/urdevices', 503, 503)
+
+    async def test(client, session):
+        return await client.bulk_create_devices(session, [{'devEUI': 'BB02', 'name': 'two'}], backoff=0)
+
+    results = run_with_gateway(gateway, test)
+    assert results[0]['status'] == 'created' and results[0]['error'] is None
+    assert len(writes(gateway, 'POST')) == 3
+    assert 'BB02' in gateway.devices
+
+
+def test_bad_request_is_not_retried():
+    gateway = make_gateway()
+    gateway.fail('POST /api/urdevices', 400)
+
+    async def test(client, session):
+        return await client.bulk_create_devices(session, [{'devEUI': 'BB02'}], backoff=0)
+
+    results = run_with_gateway(gateway, test)
+    assert results[0]['status'] == 'failed' and '400' in results[0]['error']
+    assert len(writes(gateway, 'POST')) == 1
+
+
+def test_failed_create_response_with_existing_device_is_created():
+    gateway = make_gateway()
+    gateway.fail('POST /api/urdevices', 500, after_handling=True)
+
+    async def test(client, session):
+        return await client.bulk_create_devices(session, [{'devEUI': 'BB02'}], backoff=0)
+
+    assert statuses(run_with_gateway(gateway, test)) == {'BB02': 'created'}
+    assert len(writes(gateway, 'POST')) == 1
+
+
+def test_incomplete_device_list_raises_before_planning():
+    gateway = make_gateway(devices=[{'devEUI': 'AA01'}, {'devEUI': 'AA02'}])
+    gateway.fail('GET /api/urdevices', None, 500)
+
+    async def test(client, session):
+        client.page_size = 1
+        with pytest.raises(ClientResponseError):
+            await client.bulk_delete_devices(session, ['AA02'])
+
+    run_with_gateway(gateway, test)
+    assert not writes(gateway, 'DELETE')
+
+
+def test_rate_limit_spaces_requests():
+    gateway = make_gateway(devices=[])
+
+    async def test(client, session):
+        started = time.perf_counter()
+        await client.bulk_create_devices(session, [{'devEUI': f'BB0{i}'} for i in range(4)], rate_limit=20)
+        return time.perf_counter() - started
+
+    assert run_with_gateway(gateway, test) >= 0.15
+
+
+def test_exported_csv_round_trip_is_unchanged(tmp_path):
+    path = os.path.join(os.path.dirname(__file__), '..', 'examples', 'export_devices.py')
+    spec = importlib.util.spec_from_file_location('export_devices', path)
+    export_devices = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(export_devices)
+
+    gateway = make_gateway()
+    file_path = str(tmp_path / 'devices.csv')
+    export_devices.save_devices_to_csv(list(gateway.devices.values()), file_path=file_path)
+
+    async def test(client, session):
+        devices = client.read_devices_csv(file_path)
+        assert devices == [{'name': 'one', 'devEUI': 'AA01', 'profileName': 'Profile', 'appName': 'app',
+                            'payloadName': 'codec', 'fPort': 85, 'appKey': APP_KEY}]
+        return await client.bulk_update_devices(session, devices)
+
+    assert statuses(run_with_gateway(gateway, test)) == {'AA01': 'unchanged'}
+    assert not writes(gateway, 'PUT')
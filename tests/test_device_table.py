@@ -0,0 +1,49 @@
+import pytest
+from aiohttp.client_exceptions import ClientResponseError
+
+from conftest import MockGateway, run_with_gateway
+
+pytest.importorskip('pyarrow')
+
+from milesight_gateway_api.device_table import concat_device_tables, count_devices_by, filter_devices
+
+
+def make_gateway():
+    return MockGateway(devices=[
+        {'devEUI': f'AA{i:02}', 'name': f'device {i}', 'appName': f'app{i % 2}', 'profileName': 'profile',
+         'payloadName': None if i == 0 else 'codec', 'fPort': str(85 + i % 3)}
+        for i in range(5)
+    ])
+
+
+def test_device_table_from_pages():
+    gateway = make_gateway()
+
+    async def test(client, session):
+        return await client.get_device_table(session, limit=2, gateway='gw1')
+
+    table = run_with_gateway(gateway, test)
+    assert table.num_rows == 5
+    assert str(table.schema.field('appName').type) == 'dictionary<values=string, indices=int32, ordered=0>'
+    assert table['fPort'].to_pylist() == [85, 86, 87, 85, 86]
+    assert table['payloadName'].to_pylist()[:2] == [None, 'codec']
+
+    counts = count_devices_by(concat_device_tables([table, table]), 'appName')
+    assert counts.column_names == ['appName', 'count']
+    assert count_devices_by(table, 'appName', 'fPort').column_names == ['appName', 'fPort', 'count']
+    assert dict(zip(counts['appName'].to_pylist(), counts['count'].to_pylist())) == {'app0': 6, 'app1': 4}
+    assert filter_devices(table, appName='app0', fPort=85)['devEUI'].to_pylist() == ['AA00']
+
+
+def test_failed_page_raises():
+    gateway = make_gateway()
+    gateway.fail('GET /api/urdevices', None, 500, None, 500)
+
+    async def test(client, session):
+        with pytest.raises(ClientResponseError):
+            await client.get_device_table(session, limit=2)
+        # get_all_devices keeps returning the pages fetched so far
+        return await client.get_all_devices(session, limit=2)
+
+    devices, total = run_with_gateway(gateway, test)
+    assert len(devices) == 2 and total == 5
@@ -0,0 +1,79 @@
+import asyncio
+import multiprocessing
+import threading
+
+import pytest
+
+from conftest import MockGateway
+
+from milesight_gateway_api.fleet import collect_fleet
+
+
+class GatewayThread:
+    """Runs mock gateways on an event loop in a background thread, reachable from the worker processes."""
+
+    def __init__(self, *gateways):
+        self.gateways = gateways
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        for gateway in self.gateways:
+            asyncio.run_coroutine_threadsafe(gateway.start(), self.loop).result()
+        return self
+
+    def __exit__(self, *exc):
+        for gateway in self.gateways:
+            asyncio.run_coroutine_threadsafe(gateway.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+def gateway_config(name, port):
+    return {'name': name, 'username': 'admin', 'password': 'password', 'secret_key': '1111111111111111',
+            'iv': '2222222222222222', 'base_url': 'http://127.0.0.1', 'port': port}
+
+
+def test_empty_fleet_and_unknown_method():
+    assert list(collect_fleet([])) == []
+    with pytest.raises(ValueError):
+        list(collect_fleet([gateway_config('gw', 1)], method='get_all_device'))
+    assert not multiprocessing.active_children()
+
+
+def test_good_shard_bad_gateway_and_killed_worker():
+    good = MockGateway(devices=[{'devEUI': 'AA01'}, {'devEUI': 'AA02'}])
+    slow = MockGateway(devices=[{'devEUI': 'BB01'}])
+    slow.delays['GET /api/urdevices'] = 3
+
+    with GatewayThread(good, slow):
+        # Round robin: shard 0 gets good-0 and slow, shard 1 gets good-1 and the unreachable gateway
+        gateways = [gateway_config('good-0', good.port), gateway_config('good-1', good.port),
+                    gateway_config('slow', slow.port), gateway_config('bad', 1)]
+        results = []
+        for result in collect_fleet(gateways, processes=2, timeout=10):
+            results.append(result)
+            if result['gateway'] == 'good-0':
+                # Kill shard 0 while it still waits for the slow gateway
+                worker = next(p for p in multiprocessing.active_children() if p.name == 'milesight-fleet-shard-0')
+                worker.kill()
+
+    by_gateway = {result['gateway']: result for result in results}
+    assert by_gateway['good-0']['result'] == ([{'devEUI': 'AA01'}, {'devEUI': 'AA02'}], 2)
+    assert by_gateway['good-1']['error'] is None
+    assert by_gateway['bad']['error'] and by_gateway['bad']['shard'] == 1
+    assert 'slow' not in by_gateway
+    assert by_gateway[None]['shard'] == 0 and 'exited with code' in by_gateway[None]['error']
+    assert not multiprocessing.active_children()
+
+
+def test_failed_page_is_reported_as_error():
+    gateway = MockGateway(devices=[{'devEUI': 'AA01'}, {'devEUI': 'AA02'}])
+    gateway.fail('GET /api/urdevices', None, 500)
+
+    with GatewayThread(gateway):
+        results = list(collect_fleet([gateway_config('partial', gateway.port)], method_kwargs={'limit': 1}, processes=1))
+
+    assert len(results) == 1
+    assert results[0]['result'] is None and '500' in results[0]['error']
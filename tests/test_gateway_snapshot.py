@@ -0,0 +1,80 @@
+import asyncio
+import logging
+
+import pytest
+from aiohttp.client_exceptions import ClientResponseError
+
+from conftest import MockGateway, run_with_gateway
+
+
+def make_gateway():
+    return MockGateway(
+        devices=[
+            {'devEUI': 'AA01', 'applicationID': '1', 'payloadCodecID': '3'},
+            {'devEUI': 'AA02', 'appName': 'two', 'payloadCodecID': '9'},
+            {'devEUI': 'AA03'},
+        ],
+        applications=[{'applicationID': '1', 'name': 'one'}, {'applicationID': '2', 'name': 'two'}],
+        profiles={'1': [{'profileID': 'p1'}], '2': [{'profileID': 'p2'}]},
+        codecs={'default': [{'id': 3, 'name': 'default codec'}], 'custom': [{'id': 9, 'name': 'custom codec'}]},
+        integrations={('1', 'mqtt'): {'host': 'broker'}},
+    )
+
+
+def test_snapshot_links_applications_devices_and_codecs(caplog):
+    gateway = make_gateway()
+
+    async def test(client, session):
+        return await client.get_gateway_snapshot(session)
+
+    snapshot = run_with_gateway(gateway, test)
+    one, two = snapshot['applications']
+    assert one['integrations'] == {'http': None, 'mqtt': {'host': 'broker'}}
+    assert two['integrations'] == {'http': None, 'mqtt': None}
+    assert one['profiles'] == [{'profileID': 'p1'}]
+    assert [d['devEUI'] for d in one['devices']] == ['AA01']
+    assert one['devices'][0]['payloadCodec']['name'] == 'default codec'
+    assert two['devices'][0]['payloadCodec']['name'] == 'custom codec'
+    assert [d['devEUI'] for d in snapshot['unassigned_devices']] == ['AA03']
+    assert snapshot['network_server_settings'] == {'enabled': True}
+    # Integrations that aren't configured are expected and not logged as errors
+    assert not [record for record in caplog.records if record.levelno >= logging.ERROR]
+
+
+def test_integration_errors_other_than_not_found_are_raised():
+    gateway = make_gateway()
+    gateway.fail('GET /api/urapplications/1/integrations/mqtt', 401)
+
+    async def test(client, session):
+        with pytest.raises(ClientResponseError) as error:
+            await client.get_gateway_snapshot(session)
+        assert error.value.status == 401
+
+    run_with_gateway(gateway, test)
+
+
+def test_failed_branch_cancels_the_others():
+    gateway = make_gateway()
+    gateway.delays['GET /api/urdevices'] = 0.1
+    gateway.fail('GET /api/network-server/settings', 500)
+
+    async def test(client, session):
+        client.page_size = 1
+        with pytest.raises(ClientResponseError):
+            await client.get_gateway_snapshot(session)
+        # Give uncancelled device paging the time to request further pages
+        await asyncio.sleep(0.4)
+
+    run_with_gateway(gateway, test)
+    assert len([key for key, _, _ in gateway.requests if key == 'GET /api/urdevices']) == 1
+
+
+def test_failed_codec_page_is_raised():
+    gateway = make_gateway()
+    gateway.fail('GET /api/payloadcodecs', 500)
+
+    async def test(client, session):
+        with pytest.raises(ClientResponseError):
+            await client.get_gateway_snapshot(session)
+
+    run_with_gateway(gateway, test)
@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from conftest import MockGateway, run_with_gateway
+
+from milesight_gateway_api.load_probe import find_knee, main_async, parse_args, probe_level
+
+
+def level(concurrency, requests_per_s, errors=0):
+    return {'concurrency': concurrency, 'page_size': 10, 'errors': errors, 'requests_per_s': requests_per_s}
+
+
+def test_find_knee():
+    results = [level(1, 40), level(2, 80), level(4, 160), level(8, 170), level(16, 200, errors=3)]
+    assert find_knee(results)['concurrency'] == 4
+    assert find_knee([level(1, 40, errors=1), level(2, 80, errors=2)]) is None
+
+
+def test_probe_reads_only_full_pages():
+    gateway = MockGateway(devices=[{'devEUI': f'AA{i:02}'} for i in range(25)])
+
+    async def test(client, session):
+        return await probe_level(client, session, concurrency=3, requests=12, page_size=10, device_count=25)
+
+    result = run_with_gateway(gateway, test)
+    assert result['errors'] == 0 and result['requests'] == 12
+    offsets = [query['offset'] for key, query, _ in gateway.requests if key == 'GET /api/urdevices']
+    assert sorted(set(offsets)) == ['0', '10']
+    assert result['items_per_s'] / result['requests_per_s'] == pytest.approx(10, rel=0.05)
+
+
+def test_no_output_if_every_level_failed(tmp_path):
+    gateway = MockGateway(devices=[{'devEUI': f'AA{i:02}'} for i in range(25)])
+    # The device count succeeds, every probe request fails
+    gateway.fail('GET /api/urdevices', None, *([500] * 10))
+    output = str(tmp_path / 'tuning.json')
+
+    async def test(client, session):
+        args = parse_args(['--base-url', 'http://127.0.0.1', '--port', str(gateway.port), '--username', 'admin',
+                           '--password', 'password', '--secret-key', '1111111111111111', '--iv', '2222222222222222',
+                           '--levels', '1,2', '--requests', '4', '--output', output])
+        with pytest.raises(SystemExit):
+            await main_async(args)
+
+    run_with_gateway(gateway, test)
+    assert not os.path.exists(output)
@@ -0,0 +1,58 @@
+import pytest
+from aiohttp.client_exceptions import ClientResponseError
+
+from conftest import MockGateway, run_with_gateway
+
+
+def make_gateway():
+    return MockGateway(
+        applications=[{'applicationID': '1', 'name': 'one'}, {'applicationID': '2', 'name': 'two'}],
+        profiles={
+            '1': [{'profileID': 'shared', 'profileName': 'Shared'}, {'profileID': 'p1', 'profileName': 'P1'}],
+            '2': [{'profileID': 'shared', 'profileName': 'Shared'}],
+        },
+    )
+
+
+def profile_requests(gateway):
+    return [query for key, query, _ in gateway.requests if key == 'GET /api/urprofiles']
+
+
+def test_catalogue_deduplicates_and_caches():
+    gateway = make_gateway()
+
+    async def test(client, session):
+        first = await client.get_profile_catalogue(session, '1')
+        second = await client.get_profile_catalogue(session, '1')
+        return first, second
+
+    (catalogue, count), (cached, _) = run_with_gateway(gateway, test)
+    assert count == 2
+    assert sorted(catalogue) == ['p1', 'shared']
+    assert cached is catalogue
+    assert len(profile_requests(gateway)) == 2
+
+
+def test_catalogue_is_cached_per_organization():
+    gateway = make_gateway()
+
+    async def test(client, session):
+        await client.get_profile_catalogue(session, '1')
+        await client.get_profile_catalogue(session, '2')
+
+    run_with_gateway(gateway, test)
+    assert [query['organizationID'] for query in profile_requests(gateway)] == ['1', '1', '2', '2']
+
+
+def test_failed_fetch_is_raised_and_not_cached():
+    gateway = make_gateway()
+    gateway.fail('GET /api/urprofiles', 500)
+
+    async def test(client, session):
+        with pytest.raises(ClientResponseError):
+            await client.get_profile_catalogue(session, '1')
+        assert '1' not in client.profile_catalogue
+        return await client.get_profile_catalogue(session, '1')
+
+    catalogue, _ = run_with_gateway(gateway, test)
+    assert sorted(catalogue) == ['p1', 'shared']